@@ -1,8 +1,47 @@
+from __future__ import annotations
+from typing import Optional
+
 import os
 import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 
+from detectors import BaseDetector, HaarCascadeDetector
+from frames import FaceResizer, FrameReader
+from model_cache import ModelCache, ModelNotFoundError
+from profiler import ProfilingSession
+from sharded_recognizer import ShardedRecognizer
+
+
+class AuthenticationResult:
+	"""
+	Verdict of a single authentication attempt.
+	"""
+	def __init__(
+			self,
+			accepted: bool,
+			user_id: Optional[int] = None,
+			name: Optional[str] = None,
+			confidence: Optional[float] = None,
+			elapsed: float = 0.,
+			frames: int = 0
+	):
+		self.accepted = accepted
+		self.user_id = user_id
+		self.name = name
+		self.confidence = confidence
+		self.elapsed = elapsed  # time to decision, seconds
+		self.frames = frames
+
+	def __str__(self):
+		if self.accepted:
+			verdict = f"Accepted {self.name} (id {self.user_id}), confidence {round(self.confidence)}"
+		else:
+			verdict = "Rejected"
+		return f"{verdict} in {self.elapsed:.2f} s, {self.frames} frames"
+
 
 class Authenticator:
 	"""
@@ -13,15 +52,26 @@ class Authenticator:
 			yml_path: str = 'face.yml',
 			cascade_path: str = "haarcascade_frontalface_default.xml",
 			faces_path: str = 'faces',
-			confidence_threshold: int = 100
+			confidence_threshold: int = 100,
+			model_cache: Optional[ModelCache] = None
 	):
 		self.YML_PATH = yml_path
+		self.model_cache = model_cache
 		self.CASCADE_PATH = cascade_path
 		self.FACES_PATH = faces_path
 		self.__CONFIDENCE_THRESHOLD = confidence_threshold
 		self.__FPS = 24
 		self.__PAUSE = 1 / self.__FPS
 		self.__cam_stop_flag = False
+		self.__RECOGNITION_SHARDS = 1
+		self.__FACE_SIZE = (100, 100)
+		self.__face_resizers = []
+		self.__RECOGNITION_THREADS = 1
+		self.__executor = None
+		self.profiler: Optional[ProfilingSession] = None  # the session recognition threads are sampled in
+		self.__sharded_recognizer: Optional[ShardedRecognizer] = None
+		self.__sharded_recognizer_key = None
+		self.detector: BaseDetector = HaarCascadeDetector(cascade_path)
 			
 	def __str__(self):
 		return "Face authenticator"
@@ -42,81 +92,237 @@ class Authenticator:
 		else:
 			raise ValueError("FPS should be between 1 and 30")
 
+	@property
+	def recognition_shards(self) -> int:
+		return self.__RECOGNITION_SHARDS
+
+	def set_recognition_shards(self, shards: int):
+		if not isinstance(shards, int) or not (1 <= shards <= (os.cpu_count() or 1)):
+			raise ValueError(f"Shard count should be between 1 and {os.cpu_count() or 1}")
+		if shards != self.__RECOGNITION_SHARDS:
+			self.close_recognizer()
+		self.__RECOGNITION_SHARDS = shards
+
+	@property
+	def recognition_threads(self) -> int:
+		return self.__RECOGNITION_THREADS
+
+	def set_recognition_threads(self, threads: int):
+		if not isinstance(threads, int) or not (1 <= threads <= 32):
+			raise ValueError("Recognition thread count should be between 1 and 32")
+		if self.__executor is not None:
+			self.__executor.shutdown()
+		self.__executor = ThreadPoolExecutor(threads) if threads > 1 else None
+		self.__RECOGNITION_THREADS = threads
+
 	def get_ids_and_names(self) -> dict[int: str]:
 		"""
 		:return: dict {id: username} of loaded faces
 		"""
 		return {int(file.split('.')[1]): file.split('.')[0] for file in os.listdir(self.FACES_PATH)}
 
-	def authenticate(self):
+	def _recognize(self, gray, recognizer) -> list[tuple[tuple[int, int, int, int], int, float]]:
 		"""
-		Switch on the camera and start authenticating.
+		Detect and recognize all faces on the frame
+		:return: list of (box, user id, distance) for every detected face
 		"""
-		self.__cam_stop_flag = False
+		boxes = self.detector.detect(gray)
+		while len(self.__face_resizers) < len(boxes):  # a separate buffer for every face recognized concurrently
+			self.__face_resizers.append(FaceResizer(self.__FACE_SIZE))
+		faces = [resizer.resize(gray[y:y + h, x:x + w]) for resizer, (x, y, w, h) in zip(self.__face_resizers, boxes)]
 
-		recognizer = self.create_recognizer()
-		face_cascade = cv2.CascadeClassifier(self.CASCADE_PATH)
+		if self.__executor is not None and len(faces) > 1:
+			predict = self.profiler.bind(recognizer.predict) if self.profiler is not None else recognizer.predict
+			predictions = self.__executor.map(predict, faces)  # OpenCV releases the GIL in predict
+		else:
+			predictions = map(recognizer.predict, faces)
+		return [(tuple(box), id_, confidence) for box, (id_, confidence) in zip(boxes, predictions)]
+
+	def _draw(self, img, results, names: dict[int: str]):
+		"""
+		Draw recognized faces on the frame
+		"""
 		font = cv2.FONT_HERSHEY_SIMPLEX
 
-		names = self.get_ids_and_names()
+		for (x, y, w, h), id_, confidence in results:
+			if confidence < self.__CONFIDENCE_THRESHOLD:  # some user is recognized
+				name = names[id_]
+				confidence = "Confidence:  {0}".format(round(self.__CONFIDENCE_THRESHOLD - confidence))
+				cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)  # draw a green rectangle around the face
+			else:  # unknown face
+				name = "unknown"
+				confidence = "Confidence:  {0}".format(round(self.__CONFIDENCE_THRESHOLD - confidence))
+				cv2.rectangle(img, (x, y), (x + w, y + h), (0, 0, 255), 2)  # draw a red rectangle around the face
 
+			cv2.putText(img, str(name), (x + 5, y - 5), font, 1, (255, 255, 255), 2)  # print the name of the user
+			cv2.putText(img, str(confidence), (x + 5, y + h - 5), font, 1, (255, 255, 0), 1)  # print confidence
+
+	def _open_camera(self) -> FrameReader:
 		cam = cv2.VideoCapture(0)
 		cam.set(cv2.CAP_PROP_FPS, self.__FPS)
 		cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 		cam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+		return FrameReader(cam)
 
-		while True:
-			ret, img = cam.read()
-			gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+	def authenticate(self):
+		"""
+		Switch on the camera and start authenticating.
+		"""
+		self.__cam_stop_flag = False
+
+		recognizer = self.create_recognizer()
+
+		names = self.get_ids_and_names()
+
+		cam = self._open_camera()
 
-			faces = face_cascade.detectMultiScale(
-				gray,
-				scaleFactor=1.2,
-				minNeighbors=5,
-				minSize=(10, 10),
-			)
+		try:
+			while cam.read():
+				img, gray = cam.frame, cam.gray
 
-			for (x, y, w, h) in faces:
+				self._draw(img, self._recognize(gray, recognizer), names)
 
-				id_, confidence = recognizer.predict(gray[y:y + h, x:x + w])
+				cv2.imshow('camera', img)
 
-				if confidence < self.__CONFIDENCE_THRESHOLD:  # some user is recognized
-					name = names[id_]
-					confidence = "Confidence:  {0}".format(round(self.__CONFIDENCE_THRESHOLD - confidence))
-					cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)  # draw a green rectangle around the face
-				else:  # unknown face
-					name = "unknown"
-					confidence = "Confidence:  {0}".format(round(self.__CONFIDENCE_THRESHOLD - confidence))
-					cv2.rectangle(img, (x, y), (x + w, y + h), (0, 0, 255), 2)  # draw a red rectangle around the face
+				k = cv2.waitKey(10) & 0xff  # 'ESC' to quit
+				if k == 27 or self.__cam_stop_flag:
+					break
 
-				cv2.putText(img, str(name), (x + 5, y - 5), font, 1, (255, 255, 255), 2)  # print the name of the user
-				cv2.putText(img, str(confidence), (x + 5, y + h - 5), font, 1, (255, 255, 0), 1)  # print confidence
+				time.sleep(self.__PAUSE)
+		except BaseException:
+			self.close_recognizer()
+			raise
+		finally:
+			cam.release()
+			cv2.destroyAllWindows()
 
-			cv2.imshow('camera', img)
+	def verify(self, votes: int = 3, window: int = 5, timeout: float = 10., show: bool = True) -> AuthenticationResult:
+		"""
+		Switch on the camera and authenticate until a decision is made.
+
+		Every frame votes for the closest recognized face under the confidence threshold.
+		The user is accepted as soon as `votes` of the last `window` frames agree on the same id,
+		and rejected if it does not happen within `timeout` seconds.
+		:param votes: number of agreeing frames needed to accept the user
+		:param window: number of the last frames taken into account
+		:param timeout: seconds before the rejection
+		:param show: show the camera window while authenticating
+		:return: authentication verdict
+		"""
+		if not (1 <= votes <= window):
+			raise ValueError("Votes count should be between 1 and the window size")
+		self.__cam_stop_flag = False
+
+		recognizer = self.create_recognizer()
+		names = self.get_ids_and_names()
+		cam = self._open_camera()
 
-			k = cv2.waitKey(10) & 0xff  # 'ESC' to quit
-			if k == 27 or self.__cam_stop_flag:
-				break
+		buffer = deque(maxlen=window)
+		result = None
+		frames = 0
+		start = time.monotonic()
 
-			time.sleep(self.__PAUSE)
+		try:
+			while result is None:
+				if not cam.read():
+					result = AuthenticationResult(False, elapsed=time.monotonic() - start, frames=frames)
+					break
+				img, gray = cam.frame, cam.gray
+				frames += 1
 
-		cam.release()
-		cv2.destroyAllWindows()
+				faces = self._recognize(gray, recognizer)
+				recognized = [
+					(id_, confidence) for _, id_, confidence in faces if confidence < self.__CONFIDENCE_THRESHOLD
+				]
+				buffer.append(min(recognized, key=lambda face: face[1], default=(None, None)))
+
+				counts = Counter(id_ for id_, _ in buffer if id_ is not None)
+				elapsed = time.monotonic() - start
+				if counts and max(counts.values()) >= votes:
+					id_ = counts.most_common(1)[0][0]
+					distances = [confidence for vote, confidence in buffer if vote == id_]
+					confidence = self.__CONFIDENCE_THRESHOLD - sum(distances) / len(distances)
+					result = AuthenticationResult(True, id_, names[id_], confidence, elapsed, frames)
+				elif elapsed >= timeout or self.__cam_stop_flag:
+					result = AuthenticationResult(False, elapsed=elapsed, frames=frames)
+
+				if show:
+					self._draw(img, faces, names)
+					cv2.imshow('camera', img)
+					if cv2.waitKey(1) & 0xff == 27 and result is None:  # 'ESC' to quit
+						result = AuthenticationResult(False, elapsed=elapsed, frames=frames)
+
+				if result is None:
+					time.sleep(self.__PAUSE)
+		except BaseException:
+			self.close_recognizer()
+			raise
+		finally:
+			cam.release()
+			if show:
+				cv2.destroyAllWindows()
+		return result
 
 	def create_recognizer(self):
 		"""
-		Create a LBPH face recognizer and load .yml file with its settings
+		Create a LBPH face recognizer and load .yml file with its settings.
+		The gallery is split between worker processes if more than one recognition shard is set.
+		The sharded recognizer is kept alive between authentication sessions while the model does not change,
+		so its workers are not restarted and the gallery is not copied again for every session.
 		"""
+		yml_path = self.model_path()
+		if self.__RECOGNITION_SHARDS > 1:
+			key = (yml_path, os.stat(yml_path).st_mtime_ns, self.__RECOGNITION_SHARDS)
+			if key != self.__sharded_recognizer_key:
+				self.close_recognizer()
+				self.__sharded_recognizer = ShardedRecognizer.from_model(yml_path, self.__RECOGNITION_SHARDS)
+				self.__sharded_recognizer_key = key
+			return self.__sharded_recognizer
+
+		self.close_recognizer()
 		recognizer = cv2.face.LBPHFaceRecognizer_create()
-		recognizer.read(self.YML_PATH)
+		recognizer.read(yml_path)
 		return recognizer
 
+	def close_recognizer(self):
+		"""
+		Stop the worker processes of the kept sharded recognizer, if any.
+		"""
+		if self.__sharded_recognizer is not None:
+			sharded_recognizer, self.__sharded_recognizer = self.__sharded_recognizer, None
+			self.__sharded_recognizer_key = None
+			sharded_recognizer.close()
+
+	def model_path(self) -> str:
+		"""
+		:return: path of the model trained on the current faces directory
+		"""
+		if self.model_cache is None:
+			return self.YML_PATH
+		yml_path = self.model_cache.lookup(self.FACES_PATH)
+		if yml_path is None:
+			raise ModelNotFoundError(f"There is no trained model for {self.FACES_PATH}")
+		return yml_path
+
+	def set_detector(self, detector: BaseDetector):
+		self.detector = detector
+
 	def set_faces_dir(self, new_dir):
 		if not os.path.isdir(new_dir):
 			raise NotADirectoryError(f"{new_dir} is not a directory")
 
 		self.FACES_PATH = new_dir
 
+	@property
+	def face_size(self) -> tuple[int, int]:
+		return self.__FACE_SIZE
+
+	def set_face_size(self, size: tuple[int, int]):
+		if len(size) != 2 or not all(isinstance(side, int) and side > 0 for side in size):
+			raise ValueError(f"{size} is not a valid face size")
+		self.__FACE_SIZE = tuple(size)
+		self.__face_resizers = []
+
 	@property
 	def confidence_threshold(self) -> int:
 		return self.__CONFIDENCE_THRESHOLD
@@ -0,0 +1,333 @@
+"""
+Performance benchmarks of the application.
+
+Usage:
+	python benchmark.py detectors --frames path/to/frames
+	python benchmark.py shards --samples 100000 --max-shards 8
+	python benchmark.py crops --faces-dir faces --size 100 100
+	python benchmark.py training --faces-dir faces --chunk-mb 16
+	python benchmark.py allocations --frames 300
+	python benchmark.py faces --threads 4
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from detectors import DETECTORS, DetectorLoadError, HaarCascadeDetector, create_detector
+from authenticator import Authenticator
+from face_loader import Trainer, normalize_faces_dir
+from frames import FrameReader
+from sharded_recognizer import ShardedRecognizer
+
+
+def _load_gray_frames(frames_dir: str) -> list:
+	frames = []
+	for filename in sorted(os.listdir(frames_dir)):
+		img = cv2.imread(os.path.join(frames_dir, filename))
+		if img is not None:
+			frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+	return frames
+
+
+def _capture_gray_frames(count: int) -> list:
+	frames = []
+	cam = cv2.VideoCapture(0)
+	while len(frames) < count:
+		ret, img = cam.read()
+		if not ret:
+			break
+		frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+	cam.release()
+	return frames
+
+
+def _iou(a, b) -> float:
+	ax, ay, aw, ah = a
+	bx, by, bw, bh = b
+	w = min(ax + aw, bx + bw) - max(ax, bx)
+	h = min(ay + ah, by + bh) - max(ay, by)
+	if w <= 0 or h <= 0:
+		return 0.
+	inter = w * h
+	return inter / (aw * ah + bw * bh - inter)
+
+
+def _agreement(boxes, reference, min_iou: float = 0.5) -> float:
+	"""
+	:return: share of boxes matched between two detections of the same frame (1.0 if both are empty)
+	"""
+	if len(boxes) == 0 and len(reference) == 0:
+		return 1.
+	unmatched = list(reference)
+	matched = 0
+	for box in boxes:
+		best = max(unmatched, key=lambda ref: _iou(box, ref), default=None)
+		if best is not None and _iou(box, best) >= min_iou:
+			unmatched.remove(best)
+			matched += 1
+	return 2 * matched / (len(boxes) + len(reference))
+
+
+def bench_detectors(args):
+	frames = _load_gray_frames(args.frames) if args.frames else _capture_gray_frames(args.count)
+	if not frames:
+		sys.exit("No frames to benchmark")
+
+	results = {}
+	for name in DETECTORS:
+		try:
+			detector = create_detector(name)
+		except DetectorLoadError as e:
+			print(f"{name}: skipped ({e})")
+			continue
+		detector.detect(frames[0])  # warm up
+		start = time.perf_counter()
+		results[name] = [detector.detect(frame) for frame in frames]
+		elapsed = time.perf_counter() - start
+		print(f"{name}: {elapsed * 1000 / len(frames):.2f} ms/frame, "
+			f"{sum(map(len, results[name]))} faces on {len(frames)} frames")
+
+	if args.reference not in results:
+		return
+	reference = results[args.reference]
+	for name, detections in results.items():
+		if name == args.reference:
+			continue
+		agreement = sum(_agreement(d, r) for d, r in zip(detections, reference)) / len(frames)
+		print(f"{name} vs {args.reference}: {agreement * 100:.1f}% detection agreement")
+
+
+def bench_shards(args):
+	rng = np.random.default_rng(0)
+	# 256 LBP patterns per grid cell, every cell histogram is normalized like in LBPH
+	cells = args.grid * args.grid
+	histograms = np.empty((args.samples, cells, 256), dtype=np.float32)
+	for start in range(0, args.samples, 1024):  # generated in chunks to avoid gallery-sized temporaries
+		chunk = histograms[start:start + 1024]
+		rng.random(chunk.shape, dtype=np.float32, out=chunk)
+		chunk /= chunk.sum(axis=2, keepdims=True)
+	histograms = histograms.reshape(args.samples, cells * 256)
+	labels = rng.integers(0, args.identities, args.samples)
+	queries = [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(args.queries)]
+	print(f"Gallery: {args.samples} samples, {args.identities} identities, {histograms.nbytes / 2 ** 20:.0f} MiB")
+
+	baseline = None
+	for shards in range(1, args.max_shards + 1):
+		with ShardedRecognizer(histograms, labels, shards, grid_x=args.grid, grid_y=args.grid) as recognizer:
+			recognizer.predict(queries[0])  # warm up
+			start = time.perf_counter()
+			for query in queries:
+				recognizer.predict(query)
+			elapsed = (time.perf_counter() - start) / len(queries)
+		baseline = baseline or elapsed
+		print(f"{shards} shard(s): {elapsed * 1000:.1f} ms/query, speedup x{baseline / elapsed:.2f}")
+
+
+def _dir_size(path: str) -> int:
+	return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _bench_gallery(faces_dir: str, yml_path: str, size=None):
+	start = time.perf_counter()
+	Trainer().train(faces_dir, yml_path)
+	train_time = time.perf_counter() - start
+
+	recognizer = cv2.face.LBPHFaceRecognizer_create()
+	recognizer.read(yml_path)
+	faces = [cv2.imread(os.path.join(faces_dir, f), cv2.IMREAD_GRAYSCALE) for f in os.listdir(faces_dir)]
+	start = time.perf_counter()
+	for face in faces:
+		recognizer.predict(face if size is None else cv2.resize(face, size, interpolation=cv2.INTER_AREA))
+	predict_time = (time.perf_counter() - start) / len(faces)
+	return train_time, predict_time, _dir_size(faces_dir)
+
+
+def bench_crops(args):
+	size = tuple(args.size)
+	with tempfile.TemporaryDirectory() as tmp:
+		raw_dir = shutil.copytree(args.faces_dir, os.path.join(tmp, "raw"))
+		normalized_dir = shutil.copytree(args.faces_dir, os.path.join(tmp, "normalized"))
+		normalize_faces_dir(normalized_dir, size)
+
+		for title, faces_dir, query_size in (("raw", raw_dir, None), (f"{size[0]}x{size[1]}", normalized_dir, size)):
+			train_time, predict_time, disk = _bench_gallery(faces_dir, os.path.join(tmp, f"{title}.yml"), query_size)
+			print(f"{title}: train {train_time:.2f} s, predict {predict_time * 1000:.2f} ms/face, "
+				f"{disk / 2 ** 20:.1f} MiB on disk")
+
+
+def _train_and_measure(faces_dir: str, yml_path: str, max_chunk_bytes, results):
+	start = time.perf_counter()
+	Trainer(max_chunk_bytes).train(faces_dir, yml_path)
+	elapsed = time.perf_counter() - start
+	results.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def bench_training(args):
+	samples = len(os.listdir(args.faces_dir))
+	ctx = mp.get_context("spawn")  # a fresh process for every mode, so the peak RSS is not inherited
+	results = ctx.Queue()
+	with tempfile.TemporaryDirectory() as tmp:
+		for title, chunk_bytes in (("one-shot", None), (f"streaming {args.chunk_mb} MiB", args.chunk_mb * 2 ** 20)):
+			yml_path = os.path.join(tmp, "face.yml")
+			worker = ctx.Process(target=_train_and_measure, args=(args.faces_dir, yml_path, chunk_bytes, results))
+			worker.start()
+			elapsed, max_rss = results.get()
+			worker.join()
+			print(f"{title}: {samples / elapsed:.0f} samples/s, peak RSS {max_rss / 1024:.0f} MiB")
+
+
+class _SyntheticCamera:
+	"""
+	cv2.VideoCapture stand-in which returns the same frame, honoring the destination buffer like OpenCV does.
+	"""
+	def __init__(self, frame):
+		self._frame = frame
+
+	def read(self, image=None):
+		if image is None or image.shape != self._frame.shape:
+			return True, self._frame.copy()
+		np.copyto(image, self._frame)
+		return True, image
+
+	def release(self):
+		pass
+
+
+class _FixedBoxDetector(HaarCascadeDetector):
+	"""
+	Haar detector which runs the real detectMultiScale on every frame but always reports the same face box,
+	so every synthetic frame does the detection and recognition work of a frame with one face.
+	"""
+	def __init__(self, box):
+		super().__init__()
+		self._boxes = np.array([box], dtype=np.int32)
+
+	def detect(self, gray):
+		super().detect(gray)
+		return self._boxes
+
+
+def measure_frame_allocations(frames: int, warmup: int = 10) -> tuple[int, float]:
+	"""
+	Run the authentication frame loop (read, grayscale, detection, resize, recognition) on a synthetic camera.
+	tracemalloc sees Python and numpy allocations, including the arrays OpenCV returns to Python;
+	buffers OpenCV allocates and frees internally (e.g. the detectMultiScale image pyramid) are not visible to it.
+	:return: the most bytes allocated within one frame and the bytes retained per frame
+	"""
+	rng = np.random.default_rng(0)
+	frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+	authenticator = Authenticator()
+	authenticator.set_detector(_FixedBoxDetector((200, 120, 180, 180)))
+	recognizer = cv2.face.LBPHFaceRecognizer_create()
+	recognizer.train([rng.integers(0, 256, authenticator.face_size[::-1], dtype=np.uint8) for _ in range(4)], np.arange(4))
+
+	reader = FrameReader(_SyntheticCamera(frame))
+	for _ in range(warmup):  # allocate the buffers
+		reader.read()
+		authenticator._recognize(reader.gray, recognizer)
+
+	tracemalloc.start()
+	before = tracemalloc.take_snapshot()
+	peak = 0
+	for _ in range(frames):
+		current = tracemalloc.get_traced_memory()[0]
+		tracemalloc.reset_peak()
+		reader.read()
+		authenticator._recognize(reader.gray, recognizer)
+		peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+	after = tracemalloc.take_snapshot()
+	tracemalloc.stop()
+
+	retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+	return peak, retained / frames
+
+
+def bench_allocations(args):
+	peak, retained = measure_frame_allocations(args.frames)
+	print(f"Steady state over {args.frames} frames: at most {peak} bytes allocated within a frame "
+		f"(a 640x480 frame is {640 * 480 * 3} bytes), {retained:.1f} bytes/frame retained")
+
+
+def bench_faces(args):
+	rng = np.random.default_rng(0)
+	gray = rng.integers(0, 256, (480, 640), dtype=np.uint8)
+	authenticator = Authenticator()
+	recognizer = cv2.face.LBPHFaceRecognizer_create()
+	recognizer.train(
+		[rng.integers(0, 256, authenticator.face_size[::-1], dtype=np.uint8) for _ in range(args.samples)],
+		np.arange(args.samples) % 100
+	)
+
+	for threads in (1, args.threads):
+		authenticator.set_recognition_threads(threads)
+		for count in (1, 4, 8):
+			boxes = np.array([[(i % 4) * 160, (i // 4) * 240, 150, 150] for i in range(count)], dtype=np.int32)
+			authenticator.detector.detect = lambda frame: boxes
+			authenticator._recognize(gray, recognizer)  # warm up
+			start = time.perf_counter()
+			for _ in range(args.frames):
+				authenticator._recognize(gray, recognizer)
+			elapsed = (time.perf_counter() - start) / args.frames
+			print(f"{threads} thread(s), {count} face(s): {elapsed * 1000:.1f} ms/frame")
+	authenticator.set_recognition_threads(1)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Face authentication benchmarks")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	detectors_parser = subparsers.add_parser("detectors", help="compare face detector backends")
+	detectors_parser.add_argument("--frames", help="directory with frames; the camera is used if omitted")
+	detectors_parser.add_argument("--count", type=int, default=100, help="number of camera frames")
+	detectors_parser.add_argument("--reference", default="haar", help="detector to compare the others with")
+	detectors_parser.set_defaults(func=bench_detectors)
+
+	shards_parser = subparsers.add_parser("shards", help="sharded recognition scaling on a synthetic gallery")
+	shards_parser.add_argument("--samples", type=int, default=100000, help="gallery size")
+	shards_parser.add_argument("--identities", type=int, default=1000, help="number of users in the gallery")
+	shards_parser.add_argument(
+		"--grid", type=int, default=8,
+		help="LBPH grid size, defines the histogram length; with the default 8 (as in LBPHFaceRecognizer) "
+		"a 100k gallery takes 6.25 GiB, twice that while it is copied to shared memory")
+	shards_parser.add_argument("--queries", type=int, default=20, help="number of predictions per measurement")
+	shards_parser.add_argument("--max-shards", type=int, default=os.cpu_count() or 1, help="max number of shards")
+	shards_parser.set_defaults(func=bench_shards)
+
+	crops_parser = subparsers.add_parser("crops", help="training and prediction time with raw and normalized crops")
+	crops_parser.add_argument("--faces-dir", default="faces", help="directory with faces pictures")
+	crops_parser.add_argument(
+		"--size", type=int, nargs=2, default=(100, 100), metavar=("WIDTH", "HEIGHT"), help="canonical face size")
+	crops_parser.set_defaults(func=bench_crops)
+
+	training_parser = subparsers.add_parser("training", help="peak memory and throughput of streaming training")
+	training_parser.add_argument("--faces-dir", default="faces", help="directory with faces pictures")
+	training_parser.add_argument("--chunk-mb", type=int, default=16, help="streaming chunk memory ceiling, MiB")
+	training_parser.set_defaults(func=bench_training)
+
+	allocations_parser = subparsers.add_parser("allocations", help="steady-state allocations of the frame loop")
+	allocations_parser.add_argument("--frames", type=int, default=300, help="number of measured frames")
+	allocations_parser.set_defaults(func=bench_allocations)
+
+	faces_parser = subparsers.add_parser("faces", help="recognition latency of frames with 1, 4 and 8 faces")
+	faces_parser.add_argument("--threads", type=int, default=4, help="recognition thread pool size")
+	faces_parser.add_argument("--samples", type=int, default=2000, help="gallery size")
+	faces_parser.add_argument("--frames", type=int, default=20, help="number of measured frames")
+	faces_parser.set_defaults(func=bench_faces)
+
+	args = parser.parse_args()
+	args.func(args)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from typing import Optional
+
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+
+class DetectorLoadError(Exception):
+	"""
+	Exception thrown when the model file of a face detector cannot be loaded.
+	"""
+	pass
+
+
+class BaseDetector(ABC):
+	"""
+	Face detector interface.
+	"""
+	name = "base"
+
+	@abstractmethod
+	def detect(self, gray: np.ndarray):
+		"""
+		Find faces on the grayscale image
+		:param gray: grayscale image
+		:return: sequence of (x, y, w, h) boxes
+		"""
+		pass
+
+	def __str__(self):
+		return self.name
+
+
+class CascadeDetector(BaseDetector):
+	"""
+	Face detector based on an OpenCV cascade classifier.
+	"""
+	def __init__(
+			self,
+			cascade_path: str,
+			scale_factor: float,
+			min_neighbors: int,
+			min_size: tuple[int, int]
+	):
+		if not os.path.isfile(cascade_path):
+			raise DetectorLoadError(f"Cascade file {cascade_path} not found")
+		self._cascade = cv2.CascadeClassifier(cascade_path)
+		if self._cascade.empty():
+			raise DetectorLoadError(f"Cannot load cascade from {cascade_path}")
+		self._SCALE_FACTOR = scale_factor
+		self._MIN_NEIGHBORS = min_neighbors
+		self._MIN_SIZE = min_size
+
+	def detect(self, gray: np.ndarray):
+		return self._cascade.detectMultiScale(
+			gray,
+			scaleFactor=self._SCALE_FACTOR,
+			minNeighbors=self._MIN_NEIGHBORS,
+			minSize=self._MIN_SIZE
+		)
+
+
+class HaarCascadeDetector(CascadeDetector):
+	"""
+	Haar frontal face cascade. The most accurate of the cascades, but the slowest one.
+	The same tuned parameters are used for loading faces and authentication.
+	"""
+	name = "haar"
+
+	def __init__(
+			self,
+			cascade_path: str = "haarcascade_frontalface_default.xml",
+			scale_factor: Optional[float] = None,
+			min_neighbors: Optional[int] = None,
+			min_size: Optional[tuple[int, int]] = None
+	):
+		super().__init__(cascade_path, scale_factor or 1.2, min_neighbors or 5, min_size or (20, 20))
+
+
+class LBPCascadeDetector(CascadeDetector):
+	"""
+	LBP frontal face cascade. Works on integer features, so it is several times faster than Haar
+	at the cost of more false positives, which a larger minNeighbors compensates.
+	"""
+	name = "lbp"
+
+	def __init__(
+			self,
+			cascade_path: str = "lbpcascade_frontalface_improved.xml",
+			scale_factor: Optional[float] = None,
+			min_neighbors: Optional[int] = None,
+			min_size: Optional[tuple[int, int]] = None
+	):
+		super().__init__(cascade_path, scale_factor or 1.1, min_neighbors or 6, min_size or (24, 24))
+
+
+class DNNDetector(BaseDetector):
+	"""
+	Face detector based on the OpenCV ResNet-10 SSD model.
+	The model files are not shipped with the application and have to be downloaded separately.
+	"""
+	name = "dnn"
+
+	def __init__(
+			self,
+			prototxt_path: str = "deploy.prototxt",
+			model_path: str = "res10_300x300_ssd_iter_140000.caffemodel",
+			confidence: float = 0.5,
+			input_size: tuple[int, int] = (300, 300)
+	):
+		for path in (prototxt_path, model_path):
+			if not os.path.isfile(path):
+				raise DetectorLoadError(f"DNN model file {path} not found")
+		self._net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+		self._CONFIDENCE = confidence
+		self._INPUT_SIZE = input_size
+
+	def detect(self, gray: np.ndarray):
+		h, w = gray.shape[:2]
+		img = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+		blob = cv2.dnn.blobFromImage(cv2.resize(img, self._INPUT_SIZE), 1.0, self._INPUT_SIZE, (104.0, 177.0, 123.0))
+		self._net.setInput(blob)
+		detections = self._net.forward()
+
+		faces = []
+		for i in range(detections.shape[2]):
+			if detections[0, 0, i, 2] < self._CONFIDENCE:
+				continue
+			x1, y1, x2, y2 = (detections[0, 0, i, 3:7] * np.array([w, h, w, h])).astype(int)
+			x1, y1 = max(x1, 0), max(y1, 0)
+			x2, y2 = min(x2, w), min(y2, h)
+			if x2 > x1 and y2 > y1:
+				faces.append((x1, y1, x2 - x1, y2 - y1))
+		return faces
+
+
+DETECTORS = {
+	HaarCascadeDetector.name: HaarCascadeDetector,
+	LBPCascadeDetector.name: LBPCascadeDetector,
+	DNNDetector.name: DNNDetector,
+}
+
+
+def create_detector(name: str, **kwargs) -> BaseDetector:
+	"""
+	Create a face detector by its name
+	:param name: one of DETECTORS keys
+	:param kwargs: detector parameters overriding the tuned defaults
+	"""
+	if name not in DETECTORS:
+		raise ValueError(f"Unknown detector {name}, choose one of: {', '.join(DETECTORS)}")
+	return DETECTORS[name](**kwargs)
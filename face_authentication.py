@@ -1,11 +1,16 @@
 from __future__ import annotations
+from typing import Callable, Optional
 
 import sys
 import argparse
 import os
+from contextlib import nullcontext
 
-from face_loader import FaceLoader, EmptyImageError, FaceNotFoundError
-from authenticator import Authenticator
+from face_loader import FaceLoader, BulkLoader, EmptyImageError, FaceNotFoundError
+from authenticator import Authenticator, AuthenticationResult
+from detectors import DETECTORS, DetectorLoadError, create_detector
+from model_cache import ModelCache, ModelNotFoundError
+from profiler import ProfilingSession
 
 
 class EmptyDirectoryName(Exception):
@@ -18,8 +23,10 @@ class AppManager:
 	Provides API for interacting with external applications, such as GUI or CLI.
 	"""
 	def __init__(self):
-		self.loader = FaceLoader()
-		self.authenticator = Authenticator()
+		self.model_cache = ModelCache()
+		self.loader = FaceLoader(model_cache=self.model_cache)
+		self.authenticator = Authenticator(model_cache=self.model_cache)
+		self.profiler: Optional[ProfilingSession] = None
 
 		self.__set_faces_dir('faces')
 
@@ -29,7 +36,8 @@ class AppManager:
 		:param face_id: unique integer id of the user
 		:param name: username
 		"""
-		return self.loader.load_from_camera(face_id, name)
+		with self.__profile("load_from_camera"):
+			return self.loader.load_from_camera(face_id, name)
 
 	def load_from_file(self, filename: str, face_id: int, name: str):
 		"""
@@ -38,13 +46,101 @@ class AppManager:
 		:param face_id: unique integer id of the user
 		:param name: username
 		"""
-		return self.loader.load_from_file(filename, face_id, name)
+		with self.__profile("load_from_file"):
+			return self.loader.load_from_file(filename, face_id, name)
+
+	def bulk_load(
+			self,
+			root: str,
+			workers: Optional[int] = None,
+			state_path: str = 'bulk_import.json',
+			progress: Optional[Callable[[int, int], None]] = None
+	) -> dict[str, list[str]]:
+		"""
+		Load faces of many users from a directory tree root/username/photo.jpg.
+		New users get the next available ids, the recognizer is trained once after all photos are processed.
+		An interrupted import is resumed by calling this method again with the same state_path.
+		:param root: root directory of the photo collection
+		:param workers: number of detection processes, CPU count by default
+		:param state_path: file with the import progress
+		:param progress: callback called with the number of processed and total photos
+		:return: lists of loaded photos, photos without a face and not readable files
+		"""
+		with self.__profile("bulk_load"):
+			return self.loader.bulk_load(root, workers, state_path, progress)
 
 	def authenticate(self):
 		"""
 		Start authentication.
 		"""
-		return self.authenticator.authenticate()
+		self.__ensure_trained()
+		with self.__profile("authenticate"):
+			return self.authenticator.authenticate()
+
+	def verify(self, votes: int = 3, window: int = 5, timeout: float = 10., show: bool = True) -> AuthenticationResult:
+		"""
+		Authenticate a single user and return the verdict as soon as it is known.
+		The user is accepted when `votes` of the last `window` frames recognize the same id,
+		and rejected after `timeout` seconds.
+		:return: AuthenticationResult with the verdict and the time to decision
+		"""
+		self.__ensure_trained()
+		with self.__profile("verify"):
+			return self.authenticator.verify(votes, window, timeout, show)
+
+	def remove_user(self, face_id: int):
+		"""
+		Remove the user: delete their face pictures and drop their samples from the trained model.
+		Takes time proportional to the gallery size without recomputing any face features.
+		:param face_id: id of the user
+		"""
+		self.loader.remove_user(face_id)
+
+	def merge_users(self, source_id: int, target_id: int):
+		"""
+		Merge two ids of the same person: face pictures and model samples of the source user
+		are moved to the target user, the source id is removed.
+		:param source_id: id to merge
+		:param target_id: id to keep
+		"""
+		self.loader.merge_users(source_id, target_id)
+
+	def __ensure_trained(self):
+		with self.__profile("training"):
+			self.loader.ensure_trained()
+
+	def __profile(self, name: str):
+		return self.profiler.record(name) if self.profiler is not None else nullcontext()
+
+	@property
+	def profiling(self) -> bool:
+		"""
+		Check if a profiling session is running
+		"""
+		return self.profiler is not None
+
+	def start_profiling(self, output_dir: str = 'profiles', interval: float = 0.005):
+		"""
+		Start a profiling session of authentication, face loading and training.
+		Stacks of these operations are sampled every `interval` seconds and traced with cProfile.
+		:param output_dir: directory to write the results to when the session stops
+		:param interval: sampling interval, seconds
+		"""
+		if self.profiler is not None:
+			raise RuntimeError("Profiling is already on")
+		self.profiler = ProfilingSession(output_dir, interval)
+		self.authenticator.profiler = self.profiler
+
+	def stop_profiling(self) -> tuple[str, str]:
+		"""
+		Stop the profiling session and write its results
+		:return: paths of the flamegraph-compatible collapsed stacks file and the cProfile statistics file
+		"""
+		if self.profiler is None:
+			raise RuntimeError("Profiling is already off")
+		profiler, self.profiler = self.profiler, None
+		self.authenticator.profiler = None
+		return profiler.stop()
 
 	def get_next_face_id(self) -> int:
 		"""
@@ -74,13 +170,16 @@ class AppManager:
 
 	def set_faces_dir(self, new_dir: str):
 		"""
-		Set a new directory name where the application will search for the face pictures
+		Set a new directory name where the application will search for the face pictures.
+		Only switches the directory: the model trained on it is looked up in the model cache when authentication starts,
+		and the recognizer is retrained then only if the directory has changed since the last training.
 		"""
 		if not os.path.isdir(new_dir):
 			raise NotADirectoryError(f"{new_dir} is not a directory")
 
 		self.loader.set_faces_dir(new_dir)
 		self.authenticator.set_faces_dir(new_dir)
+		self.__faces_dir = new_dir
 
 	@property
 	def confidence_threshold(self) -> int:
@@ -116,8 +215,156 @@ class AppManager:
 		"""
 		self.authenticator.set_fps(fps)
 
+	@property
+	def face_size(self) -> tuple[int, int]:
+		"""
+		Get the canonical (width, height) face pictures are resized to before saving and recognition
+		"""
+		return self.loader.face_size
+
+	def set_face_size(self, size: tuple[int, int]):
+		"""
+		Set a new canonical face picture size.
+		Call normalize_faces afterwards to bring already saved faces to this size.
+		:param size: (width, height) of the face picture
+		"""
+		self.loader.set_face_size(size)
+		self.authenticator.set_face_size(size)
+
+	def normalize_faces(self):
+		"""
+		Resize saved face pictures to the canonical size and retrain the recognizer
+		:return: number of resized pictures
+		"""
+		with self.__profile("training"):
+			return self.loader.normalize_faces()
+
+	@property
+	def training_memory_limit(self) -> Optional[int]:
+		"""
+		Get the memory ceiling (MiB) of training, None if the whole gallery is loaded
+		"""
+		chunk_bytes = self.loader.training_chunk_bytes
+		return None if chunk_bytes is None else chunk_bytes // 2 ** 20
+
+	def set_training_memory_limit(self, megabytes: Optional[int]):
+		"""
+		Train in chunks of face pictures whose pictures and histograms take at most `megabytes` MiB.
+		Histograms are written to the model file chunk by chunk, so besides the chunk only the labels are kept.
+		Useful for huge galleries, None loads the whole gallery at once.
+		"""
+		self.loader.set_training_chunk_bytes(None if megabytes is None else megabytes * 2 ** 20)
+
+	@property
+	def recognition_threads(self) -> int:
+		"""
+		Get the number of threads recognizing faces found on the same frame
+		"""
+		return self.authenticator.recognition_threads
+
+	def set_recognition_threads(self, threads: int):
+		"""
+		Recognize several faces found on the same frame concurrently in a pool of `threads` threads.
+		1 means the faces are recognized one by one.
+		"""
+		self.authenticator.set_recognition_threads(threads)
+
+	@property
+	def recognition_shards(self) -> int:
+		"""
+		Get the number of worker processes the trained gallery is split between during authentication
+		"""
+		return self.authenticator.recognition_shards
+
+	def set_recognition_shards(self, shards: int):
+		"""
+		Split the trained gallery by identity between several worker processes.
+		Useful for large galleries, 1 means recognition in the main process.
+		"""
+		self.authenticator.set_recognition_shards(shards)
+
+	@property
+	def detector(self) -> str:
+		"""
+		Get the name of the current face detector
+		"""
+		return self.authenticator.detector.name
+
+	@property
+	def available_detectors(self) -> list[str]:
+		"""
+		Get names of all supported face detectors
+		"""
+		return list(DETECTORS)
+
+	def set_detector(self, name: str):
+		"""
+		Set a face detector used both for loading new faces and authentication.
+		Every detector uses its own tuned parameters; the current detector is kept if the name does not change.
+		:param name: detector name, one of available_detectors
+		"""
+		if name == self.detector:
+			return
+		detector = create_detector(name)
+		self.loader.set_detector(detector)
+		self.authenticator.set_detector(detector)
+
 	def camera_off(self):
 		"""
 		Turn the camera off and quit authentication mode
 		"""
 		self.authenticator.camera_off()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Face authentication command line tools")
+	parser.add_argument("--faces-dir", default="faces", help="directory with faces pictures")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	normalize_parser = subparsers.add_parser("normalize", help="resize saved faces to the canonical size and retrain")
+	normalize_parser.add_argument(
+		"--size", type=int, nargs=2, default=(100, 100), metavar=("WIDTH", "HEIGHT"), help="canonical face size")
+
+	import_parser = subparsers.add_parser("import", help="load faces from a directory tree root/username/photo.jpg")
+	import_parser.add_argument("root", help="root directory of the photo collection")
+	import_parser.add_argument("--workers", type=int, help="number of detection processes, CPU count by default")
+	import_parser.add_argument("--state", default="bulk_import.json", help="import progress file used to resume")
+
+	verify_parser = subparsers.add_parser("verify", help="authenticate a single user and print the verdict")
+	verify_parser.add_argument("--votes", type=int, default=3, help="agreeing frames needed to accept the user")
+	verify_parser.add_argument("--window", type=int, default=5, help="number of the last frames taken into account")
+	verify_parser.add_argument("--timeout", type=float, default=10., help="seconds before the rejection")
+	verify_parser.add_argument("--no-window", action="store_true", help="do not show the camera window")
+
+	args = parser.parse_args()
+	if args.command == "import":  # importing into a new faces directory is how a new site is set up
+		os.makedirs(args.faces_dir, exist_ok=True)
+	elif not os.path.isdir(args.faces_dir):
+		parser.error(f"faces directory {args.faces_dir} does not exist")
+	app = AppManager()
+	app.set_faces_dir(args.faces_dir)
+
+	if args.command == "normalize":
+		app.set_face_size(tuple(args.size))
+		print(f"Resized {app.normalize_faces()} face pictures in {args.faces_dir}")
+
+	elif args.command == "import":
+		def print_progress(done: int, total: int):
+			print(f"\rProcessed {done}/{total} photos", end="", flush=True)
+
+		report = app.bulk_load(args.root, args.workers, args.state, print_progress)
+		print()
+		print(f"Loaded {len(report[BulkLoader.LOADED])} faces")
+		for status, title in ((BulkLoader.NO_FACE, "No face found"), (BulkLoader.EMPTY, "Not an image")):
+			if report[status]:
+				print(f"{title} ({len(report[status])}):")
+				print("\n".join(f"  {src}" for src in sorted(report[status])))
+
+	elif args.command == "verify":
+		result = app.verify(args.votes, args.window, args.timeout, not args.no_window)
+		print(result)
+		return 0 if result.accepted else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -3,9 +3,10 @@ import os
 
 from PySide2.QtCore import Slot, Qt
 from PySide2.QtWidgets import QMainWindow, QAction, QApplication, QPushButton, QVBoxLayout, QWidget, QStackedLayout, \
-    QLabel, QLineEdit, QFileDialog, QErrorMessage, QHBoxLayout, QSlider
+    QLabel, QLineEdit, QFileDialog, QErrorMessage, QHBoxLayout, QSlider, QComboBox, \
+    QCheckBox
 
-from face_authentication import AppManager, EmptyImageError, FaceNotFoundError
+from face_authentication import AppManager, EmptyImageError, FaceNotFoundError, DetectorLoadError
 
 
 class SettingsWidget(QWidget):
@@ -75,6 +76,21 @@ class SettingsWidget(QWidget):
 
         self.layout.addLayout(self.fps_layout)
 
+        self.detector_layout = QHBoxLayout()
+        self.detector_label = QLabel("Face detector:")
+        self.detector_layout.addWidget(self.detector_label)
+
+        self.detector_combo_box = QComboBox()
+        self.detector_combo_box.addItems(app.available_detectors)
+        self.detector_combo_box.setCurrentText(app.detector)
+        self.detector_layout.addWidget(self.detector_combo_box)
+
+        self.layout.addLayout(self.detector_layout)
+
+        self.profiling_check_box = QCheckBox("Profile authentication and face loading (results are saved to 'profiles')")
+        self.profiling_check_box.setChecked(app.profiling)
+        self.layout.addWidget(self.profiling_check_box)
+
         self.layout.addStretch()
 
         self.save_settings_button = QPushButton("Save")
@@ -107,6 +123,8 @@ class SettingsWidget(QWidget):
         self.reset_faces_directory()
         self.reset_confidence_threshold()
         self.reset_camera_img_count()
+        self.reset_detector()
+        self.reset_profiling()
         self.parent().set_main_menu()
 
     @Slot()
@@ -116,7 +134,9 @@ class SettingsWidget(QWidget):
             app.set_confidence_threshold(self.confidence_threshold_slider.value())
             app.set_camera_image_count(self.camera_img_count_slider.value())
             app.set_fps(self.fps_slider.value())
-        except (NotADirectoryError, ValueError) as e:
+            app.set_detector(self.detector_combo_box.currentText())
+            self.save_profiling()
+        except (NotADirectoryError, ValueError, DetectorLoadError) as e:
             error_message = QErrorMessage(self)
             error_message.showMessage(str(e))
         except Exception as e:
@@ -142,6 +162,20 @@ class SettingsWidget(QWidget):
         self.camera_img_count_description.setText(f"Camera shots while loading a face: {app.camera_image_count}")
         self.camera_img_count_slider.setValue(app.camera_image_count)
 
+    def reset_detector(self):
+        self.detector_combo_box.setCurrentText(app.detector)
+
+    def save_profiling(self):
+        if self.profiling_check_box.isChecked() and not app.profiling:
+            app.start_profiling()
+        elif not self.profiling_check_box.isChecked() and app.profiling:
+            collapsed_path, pstats_path = app.stop_profiling()
+            message = QErrorMessage(self)
+            message.showMessage(f"Profile saved to {collapsed_path} and {pstats_path}")
+
+    def reset_profiling(self):
+        self.profiling_check_box.setChecked(app.profiling)
+
 
 class FaceLoadingWidget(QWidget):
     """
@@ -424,4 +458,7 @@ if __name__ == '__main__':
     window.resize(800, 600)
     window.show()
 
-    sys.exit(ui_app.exec_())
+    exit_code = ui_app.exec_()
+    if app.profiling:
+        app.stop_profiling()
+    sys.exit(exit_code)
@@ -1,12 +1,18 @@
 from __future__ import annotations
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
+import json
 import os
 from abc import ABC, abstractmethod
+from multiprocessing import Pool
 
 import cv2
 import numpy as np
 
+from detectors import BaseDetector, HaarCascadeDetector, create_detector
+from frames import FaceResizer, FrameReader
+from model_cache import ModelCache, ModelNotFoundError
+
 
 class NoSourceProvidedError(Exception):
 	"""
@@ -32,12 +38,17 @@ class FaceLoader:
 	"""
 	Face loading manager.
 	"""
-	def __init__(self, saves_path: str = 'faces', cascade_path: str = "haarcascade_frontalface_default.xml"):
-		self.faceCascade = cv2.CascadeClassifier(cascade_path)
+	def __init__(
+			self,
+			saves_path: str = 'faces',
+			cascade_path: str = "haarcascade_frontalface_default.xml",
+			model_cache: Optional[ModelCache] = None
+	):
 		self.camera_loader = CameraLoader()
 		self.file_loader = FileLoader()
-		self.trainer = Trainer()
+		self.trainer = Trainer(model_cache=model_cache)
 		self._SAVES_PATH = saves_path
+		self.set_detector(HaarCascadeDetector(cascade_path))
 
 	def __str__(self):
 		return "Face Loader"
@@ -70,6 +81,124 @@ class FaceLoader:
 			raise NotADirectoryError(f"{new_dir} is not a directory")
 		self._SAVES_PATH = new_dir
 
+	def _user_files(self, face_id: int) -> list[str]:
+		return [f for f in os.listdir(self._SAVES_PATH) if int(f.split('.')[1]) == face_id]
+
+	def remove_user(self, face_id: int):
+		"""
+		Remove all faces of the user and update the recognizer without retraining
+		:param face_id: id of the user
+		"""
+		self.ensure_trained()
+		recognizer = self.trainer.load_model(self._SAVES_PATH)
+		files = self._user_files(face_id)
+		if not files:
+			raise ValueError(f"There is no user with id {face_id}")
+
+		for filename in files:
+			os.remove(os.path.join(self._SAVES_PATH, filename))
+		self.trainer.relabel(self._SAVES_PATH, recognizer, {face_id: None})
+
+	def merge_users(self, source_id: int, target_id: int):
+		"""
+		Move all faces of the source user to the target user and update the recognizer without retraining
+		:param source_id: id of the user to merge, it is removed
+		:param target_id: id of the user who gets the faces
+		"""
+		if source_id == target_id:
+			raise ValueError("Cannot merge a user with itself")
+		self.ensure_trained()
+		recognizer = self.trainer.load_model(self._SAVES_PATH)
+		source_files = self._user_files(source_id)
+		target_files = self._user_files(target_id)
+		if not source_files:
+			raise ValueError(f"There is no user with id {source_id}")
+		if not target_files:
+			raise ValueError(f"There is no user with id {target_id}")
+
+		name = target_files[0].split('.')[0]
+		num = max(int(f.split('.')[2]) for f in target_files)
+		for filename in source_files:
+			num += 1
+			os.rename(
+				os.path.join(self._SAVES_PATH, filename),
+				os.path.join(self._SAVES_PATH, f"{name}.{target_id}.{num}.jpg")
+			)
+		self.trainer.relabel(self._SAVES_PATH, recognizer, {source_id: target_id})
+
+	def ensure_trained(self):
+		"""
+		Train the recognizer if there is no cached model for the current content of the faces directory
+		"""
+		if os.listdir(self._SAVES_PATH) and not self.trainer.is_trained(self._SAVES_PATH):
+			self.trainer.train(self._SAVES_PATH)
+
+	def set_detector(self, detector: BaseDetector):
+		"""
+		Set a face detector used while loading new faces
+		:param detector: detector instance
+		"""
+		self.detector = detector
+		self.camera_loader.set_detector(detector)
+		self.file_loader.set_detector(detector)
+
+	def bulk_load(
+			self,
+			root: str,
+			workers: Optional[int] = None,
+			state_path: str = 'bulk_import.json',
+			progress: Optional[Callable[[int, int], None]] = None
+	) -> dict[str, list[str]]:
+		"""
+		Load faces from a directory tree of photos and train the recognizer once at the end
+		:param root: directory with a subdirectory of photos for every user: root/username/photo.jpg
+		:param workers: number of detection processes, CPU count by default
+		:param state_path: file with the import progress which allows to resume an interrupted import
+		:param progress: callback called with the number of processed and total photos
+		:return: lists of loaded photos, photos without a face and not readable files
+		"""
+		bulk_loader = BulkLoader(workers, state_path)
+		bulk_loader.set_detector(self.detector)
+		bulk_loader.set_face_size(self.face_size)
+		report = bulk_loader.load(self._SAVES_PATH, source=root, progress=progress)
+		if report[BulkLoader.LOADED]:
+			self.trainer.train(self._SAVES_PATH)
+		bulk_loader.finish()  # only now, so an import interrupted while training resumes without a new plan
+		return report
+
+	def set_face_size(self, size: tuple[int, int]):
+		"""
+		Set the canonical size of saved face pictures
+		:param size: (width, height) of the face picture
+		"""
+		self.camera_loader.set_face_size(size)
+		self.file_loader.set_face_size(size)
+
+	@property
+	def face_size(self) -> tuple[int, int]:
+		return self.file_loader.face_size
+
+	def normalize_faces(self):
+		"""
+		Resize already saved face pictures to the canonical size and retrain the recognizer
+		:return: number of resized pictures
+		"""
+		resized = normalize_faces_dir(self._SAVES_PATH, self.face_size)
+		if resized:
+			self.trainer.train(self._SAVES_PATH)
+		return resized
+
+	@property
+	def training_chunk_bytes(self) -> Optional[int]:
+		return self.trainer.max_chunk_bytes
+
+	def set_training_chunk_bytes(self, max_chunk_bytes: Optional[int]):
+		"""
+		Set the memory ceiling of decoded images held at once while training
+		:param max_chunk_bytes: bytes of images fed to the recognizer at once, None to load the whole gallery
+		"""
+		self.trainer.set_max_chunk_bytes(max_chunk_bytes)
+
 	@property
 	def camera_image_counter(self) -> int:
 		return self.camera_loader.image_count
@@ -85,15 +214,34 @@ class BaseImageLoader(ABC):
 			min_neighbors: Optional[int] = None,
 			min_size: Optional[tuple[int, int]] = None
 	):
-		self._SCALE_FACTOR = scale_factor or 1.2
-		self._MIN_NEIGHBORS = min_neighbors or 5
-		self._MIN_SIZE = min_size or (20, 20)
-		self.face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+		self.detector: BaseDetector = HaarCascadeDetector(
+			scale_factor=scale_factor,
+			min_neighbors=min_neighbors,
+			min_size=min_size
+		)
 		self._SAVES_PATH = "faces"
+		self._face_resizer = FaceResizer((100, 100))
+
+	def set_detector(self, detector: BaseDetector):
+		self.detector = detector
+
+	@property
+	def face_size(self) -> tuple[int, int]:
+		return self._face_resizer.size
 
-	def _save_face(self, face_id: int, num: int, img: str, username: str = "user"):
+	def set_face_size(self, size: tuple[int, int]):
+		"""
+		Set a new canonical size of saved face pictures
+
+		:param size: (width, height) of the face picture
+		"""
+		if len(size) != 2 or not all(isinstance(side, int) and side > 0 for side in size):
+			raise ValueError(f"{size} is not a valid face size")
+		self._face_resizer = FaceResizer(size)
+
+	def _save_face(self, face_id: int, num: int, img: np.ndarray, username: str = "user"):
 		file_path = f"{self._SAVES_PATH}/{username}.{face_id}.{num}.jpg"
-		cv2.imwrite(file_path, img)
+		cv2.imwrite(file_path, self._face_resizer.resize(img))
 
 	@abstractmethod
 	def load(self, save_path: str, face_id: int, name: str, source: Optional[str] = None):
@@ -124,16 +272,11 @@ class CameraLoader(BaseImageLoader):
 		count = 0
 		cap = cv2.VideoCapture(0)
 		cap.set(cv2.CAP_PROP_FPS, 24)
-		while True:
-			ret, img = cap.read()
-			gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+		reader = FrameReader(cap)
+		while reader.read():
+			img, gray = reader.frame, reader.gray
 
-			faces = self.face_cascade.detectMultiScale(
-				gray,
-				scaleFactor=self._SCALE_FACTOR,
-				minNeighbors=self._MIN_NEIGHBORS,
-				minSize=self._MIN_SIZE
-			)
+			faces = self.detector.detect(gray)
 
 			for (x, y, w, h) in faces:
 				cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
@@ -191,54 +334,393 @@ class FileLoader(BaseImageLoader):
 		if img is None:
 			raise EmptyImageError("Empty image!")
 		gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-		retval = self.face_cascade.detectMultiScale(
-			gray,
-			scaleFactor=self._SCALE_FACTOR,
-			minNeighbors=self._MIN_NEIGHBORS,
-			minSize=self._MIN_SIZE
-		)
-		if retval == ():
+		retval = self.detector.detect(gray)
+		if len(retval) == 0:
 			raise FaceNotFoundError("Face not found!")
 		x, y, w, h = retval[0]
 		count = len(list(filter(lambda f: int(f.split('.')[1]) == face_id, os.listdir(save_path))))
 		self._save_face(face_id, count+1, gray[y:y + h, x:x + w], name)
 
 
+_bulk_worker_detector: Optional[BaseDetector] = None
+
+
+def _init_bulk_worker(detector_name: str):
+	global _bulk_worker_detector
+	_bulk_worker_detector = create_detector(detector_name)
+
+
+def _crop_face(task: tuple[str, str, tuple[int, int]]) -> tuple[str, str]:
+	"""
+	Detect a face on the source photo and save its normalized crop, runs in a BulkLoader worker process
+	:param task: source photo, target face picture and canonical face size
+	:return: source photo and the BulkLoader status of it
+	"""
+	source, target, size = task
+	img = cv2.imread(source)
+	if img is None:
+		return source, BulkLoader.EMPTY
+	gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+	faces = _bulk_worker_detector.detect(gray)
+	if len(faces) == 0:
+		return source, BulkLoader.NO_FACE
+	x, y, w, h = faces[0]
+	cv2.imwrite(target, cv2.resize(gray[y:y + h, x:x + w], size, interpolation=cv2.INTER_AREA))
+	return source, BulkLoader.LOADED
+
+
+class BulkLoader(BaseImageLoader):
+	"""
+	Loading faces from a large photo collection manager.
+
+	Expects a directory tree root/username/photo.jpg, detection and cropping run in a process pool.
+	The import plan and the processed photos are stored in a state file,
+	so an interrupted import continues from where it stopped.
+	The state file is kept until finish() is called after the training, so an import interrupted while training
+	goes straight to the training on the next run instead of planning the photos again.
+	"""
+	LOADED = "loaded"
+	NO_FACE = "no_face"
+	EMPTY = "empty"
+
+	IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+	def __init__(self, workers: Optional[int] = None, state_path: str = 'bulk_import.json'):
+		super().__init__()
+		self._WORKERS = workers or os.cpu_count() or 1
+		self._STATE_PATH = state_path
+		self._STATE_SAVE_INTERVAL = 100
+
+	def __str__(self):
+		return "Bulk loader"
+
+	@staticmethod
+	def _existing_faces(save_path: str) -> tuple[dict[str, int], dict[int, int]]:
+		"""
+		:return: ids of already loaded users and the last picture number of every id
+		"""
+		ids = {}
+		last_nums = {}
+		for filename in os.listdir(save_path):
+			name, face_id, num = filename.split('.')[:3]
+			ids.setdefault(name, int(face_id))
+			last_nums[int(face_id)] = max(last_nums.get(int(face_id), 0), int(num))
+		return ids, last_nums
+
+	def _plan(self, save_path: str, root: str) -> dict[str, str]:
+		"""
+		Assign ids to the users and target file names to the photos
+		:return: dict {source photo: target face picture}
+		"""
+		ids, last_nums = self._existing_faces(save_path)
+		next_id = max(ids.values(), default=-1) + 1
+		plan = {}
+
+		for username in sorted(os.listdir(root)):
+			user_dir = os.path.join(root, username)
+			if not os.path.isdir(user_dir):
+				continue
+			name = username.replace('.', '_')
+			if name not in ids:
+				ids[name] = next_id
+				next_id += 1
+			face_id = ids[name]
+
+			for dir_path, _, filenames in sorted(os.walk(user_dir)):
+				for filename in sorted(filenames):
+					if not filename.lower().endswith(self.IMAGE_EXTENSIONS):
+						continue
+					last_nums[face_id] = last_nums.get(face_id, 0) + 1
+					plan[os.path.join(dir_path, filename)] = f"{save_path}/{name}.{face_id}.{last_nums[face_id]}.jpg"
+
+		return plan
+
+	def _read_state(self, save_path: str, root: str) -> Optional[dict]:
+		if not os.path.isfile(self._STATE_PATH):
+			return None
+		with open(self._STATE_PATH) as f:
+			state = json.load(f)
+		if state["root"] != os.path.abspath(root):
+			raise RuntimeError(f"{self._STATE_PATH} belongs to an unfinished import of {state['root']}")
+		if state["faces"] != os.path.abspath(save_path):  # the plan targets are the pictures of that directory
+			raise RuntimeError(f"{self._STATE_PATH} belongs to an unfinished import into {state['faces']}")
+		return state
+
+	def _write_state(self, state: dict):
+		tmp_path = self._STATE_PATH + '.tmp'
+		with open(tmp_path, 'w') as f:
+			json.dump(state, f)
+		os.replace(tmp_path, self._STATE_PATH)
+
+	def load(
+			self,
+			save_path: str,
+			face_id: int = 0,
+			name: str = "user",
+			source: Optional[str] = None,
+			progress: Optional[Callable[[int, int], None]] = None
+	) -> dict[str, list[str]]:
+		"""
+		Load faces from all photos of the directory tree, face_id and name are taken from the tree
+		:param save_path: path to save face pictures
+		:param source: root directory of the photo collection
+		:param progress: callback called with the number of processed and total photos
+		:return: lists of loaded photos, photos without a face and not readable files
+		"""
+		if source is None:
+			raise NoSourceProvidedError
+		if not os.path.isdir(source):
+			raise NotADirectoryError(f"{source} is not a directory")
+
+		state = self._read_state(save_path, source)
+		if state is None:
+			state = {
+				"root": os.path.abspath(source),
+				"faces": os.path.abspath(save_path),
+				"plan": self._plan(save_path, source),
+				"done": {}
+			}
+			self._write_state(state)
+
+		tasks = [
+			(src, target, self.face_size) for src, target in state["plan"].items() if src not in state["done"]
+		]
+		total = len(state["plan"])
+
+		if tasks:  # a rerun of an import interrupted while training has nothing left to detect
+			try:
+				with Pool(self._WORKERS, initializer=_init_bulk_worker, initargs=(self.detector.name,)) as pool:
+					for i, (src, status) in enumerate(pool.imap_unordered(_crop_face, tasks, chunksize=16), 1):
+						state["done"][src] = status
+						if i % self._STATE_SAVE_INTERVAL == 0:
+							self._write_state(state)
+						if progress is not None:
+							progress(len(state["done"]), total)
+			finally:
+				self._write_state(state)
+		elif progress is not None:
+			progress(len(state["done"]), total)
+
+		report = {self.LOADED: [], self.NO_FACE: [], self.EMPTY: []}
+		for src, status in state["done"].items():
+			report[status].append(src)
+		return report
+
+	def finish(self):
+		"""
+		Remove the state file once the import is complete, including the training
+		"""
+		if os.path.isfile(self._STATE_PATH):
+			os.remove(self._STATE_PATH)
+
+
 class Trainer:
 	"""
 	LBPH Face recognizer training manager.
 	"""
-	def __init__(self):
-		pass
+	def __init__(self, max_chunk_bytes: Optional[int] = None, model_cache: Optional[ModelCache] = None):
+		self._MAX_CHUNK_BYTES = max_chunk_bytes
+		self.model_cache = model_cache
 
 	def __str__(self):
 		return "Trainer"
 
+	@property
+	def max_chunk_bytes(self) -> Optional[int]:
+		return self._MAX_CHUNK_BYTES
+
+	def set_max_chunk_bytes(self, max_chunk_bytes: Optional[int]):
+		"""
+		Set the memory ceiling of training: decoded images and their histograms held at once
+
+		:param max_chunk_bytes: bytes of images and histograms of a chunk, None to load the whole gallery
+		"""
+		if max_chunk_bytes is not None and (not isinstance(max_chunk_bytes, int) or max_chunk_bytes <= 0):
+			raise ValueError(f"{max_chunk_bytes} must be a positive integer")
+		self._MAX_CHUNK_BYTES = max_chunk_bytes
+
 	@staticmethod
-	def _get_faces_and_ids(path: str) -> tuple[list[str], list[int]]:
+	def _iter_faces_and_ids(path: str) -> Iterator[tuple[np.ndarray, int]]:
+		"""
+		:param path: a directory with saved faces pictures
+		:return: generator of face images and corresponding user ids
+		"""
+		for filename in os.listdir(path):
+			img = cv2.imread(os.path.join(path, filename))
+			gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+			face_id = int(filename.split('.')[1])
+			yield gray, face_id
+
+	@classmethod
+	def _get_faces_and_ids(cls, path: str) -> tuple[list[np.ndarray], list[int]]:
 		"""
 		:param path: a directory with saved faces pictures
 		:return: two lists with face images and corresponding user ids
 		"""
-		img_paths = [os.path.join(path, f) for f in os.listdir(path)]
 		faces = []
 		ids = []
 
-		for img_path in img_paths:
-			img = cv2.imread(img_path)
-			gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+		for gray, face_id in cls._iter_faces_and_ids(path):
 			faces.append(gray)
-			face_id = int(os.path.split(img_path)[-1].split('.')[1])
 			ids.append(face_id)
 
 		return faces, ids
 
-	def train(self, path: str):
+	def _iter_chunks(self, path: str, histogram_bytes: int) -> Iterator[tuple[list[np.ndarray], list[int]]]:
+		"""
+		:param path: a directory with saved faces pictures
+		:param histogram_bytes: size of the histogram computed for every face
+		:return: generator of face images and ids chunks, which take at most self._MAX_CHUNK_BYTES with their histograms
+		"""
+		faces = []
+		ids = []
+		size = 0
+
+		for gray, face_id in self._iter_faces_and_ids(path):
+			sample_bytes = gray.nbytes + histogram_bytes
+			if faces and size + sample_bytes > self._MAX_CHUNK_BYTES:
+				yield faces, ids
+				faces, ids, size = [], [], 0
+			faces.append(gray)
+			ids.append(face_id)
+			size += sample_bytes
+
+		yield faces, ids
+
+	def is_trained(self, path: str) -> bool:
+		"""
+		:param path: directory with faces pictures
+		:return: True if there is a cached model for the current content of the directory
+		"""
+		return self.model_cache is not None and self.model_cache.lookup(path) is not None
+
+	def train(self, path: str, yml_path: Optional[str] = None) -> str:
+		"""
+		Train a LPBH Face Recognizer and create a .yml description.
+		If the chunk memory ceiling is set, the histograms of every chunk are written to the model file
+		as soon as they are computed, so only one chunk and the labels are held in memory.
+		The model is the same as the one trained on the whole gallery at once.
+		:param path: directory with faces pictures
+		:param yml_path: where to write the trained model, the model cache or face.yml by default
+		:return: path of the trained model
+		"""
+		cached = yml_path is None
+		yml_path = yml_path or self._new_model_path(path)
+
+		recognizer = cv2.face.LBPHFaceRecognizer_create()
+		if self._MAX_CHUNK_BYTES is None:
+			faces, ids = self._get_faces_and_ids(path)
+			recognizer.train(faces, np.array(ids))
+			recognizer.write(yml_path)
+		else:
+			histogram_bytes = recognizer.getGridX() * recognizer.getGridY() * 2 ** recognizer.getNeighbors() * 4
+			fs = self._start_model(yml_path, recognizer)
+			labels = []
+			for faces, ids in self._iter_chunks(path, histogram_bytes):
+				recognizer.train(faces, np.array(ids))  # retraining drops the histograms of the previous chunk
+				for histogram in recognizer.getHistograms():
+					fs.write('', histogram)
+				labels.extend(ids)
+			self._finish_model(fs, np.array(labels))
+
+		if cached and self.model_cache is not None:
+			self.model_cache.prune(path, yml_path)
+		return yml_path
+
+	def _new_model_path(self, path: str) -> str:
+		return self.model_cache.new_model_path(path) if self.model_cache is not None else 'face.yml'
+
+	def load_model(self, path: str):
 		"""
-		Train a LPBH Face Recognizer and create a .yml description
 		:param path: directory with faces pictures
+		:return: LBPH Face Recognizer trained on the current content of the directory
 		"""
-		faces, ids = self._get_faces_and_ids(path)
+		yml_path = self.model_cache.lookup(path) if self.model_cache is not None else 'face.yml'
+		if yml_path is None or not os.path.isfile(yml_path):
+			raise ModelNotFoundError(f"There is no trained model for {path}")
 		recognizer = cv2.face.LBPHFaceRecognizer_create()
-		recognizer.train(faces, np.array(ids))
-		recognizer.write('face.yml')
+		recognizer.read(yml_path)
+		return recognizer
+
+	@staticmethod
+	def _start_model(yml_path: str, recognizer):
+		"""
+		Start writing a LBPH model in the format of LBPHFaceRecognizer.write with the parameters of the recognizer
+		:return: file storage positioned in the histograms sequence, to be completed by _finish_model
+		"""
+		fs = cv2.FileStorage(yml_path, cv2.FILE_STORAGE_WRITE)
+		fs.startWriteStruct('opencv_lbphfaces', cv2.FileNode_MAP)
+		fs.write('threshold', recognizer.getThreshold())
+		fs.write('radius', recognizer.getRadius())
+		fs.write('neighbors', recognizer.getNeighbors())
+		fs.write('grid_x', recognizer.getGridX())
+		fs.write('grid_y', recognizer.getGridY())
+		fs.startWriteStruct('histograms', cv2.FileNode_SEQ)
+		return fs
+
+	@staticmethod
+	def _finish_model(fs, labels: np.ndarray):
+		"""
+		Write the labels of the histograms written so far and close the model file
+		"""
+		fs.endWriteStruct()
+		fs.write('labels', labels.reshape(-1, 1).astype(np.int32))
+		fs.startWriteStruct('labelsInfo', cv2.FileNode_SEQ)
+		fs.endWriteStruct()
+		fs.endWriteStruct()
+		fs.release()
+
+	@classmethod
+	def _write_model(cls, yml_path: str, recognizer, histograms: list[np.ndarray], labels: np.ndarray):
+		"""
+		Write a LBPH model in the format of LBPHFaceRecognizer.write with the given samples
+		"""
+		fs = cls._start_model(yml_path, recognizer)
+		for histogram in histograms:
+			fs.write('', histogram)
+		cls._finish_model(fs, labels)
+
+	def relabel(self, path: str, recognizer, mapping: dict[int, Optional[int]]) -> Optional[str]:
+		"""
+		Update the model after samples of some users were removed from the directory or moved to another id.
+		LBPH histograms do not depend on the labels, so the samples are dropped or relabeled without retraining.
+		:param path: directory with faces pictures, already changed
+		:param recognizer: model trained on the directory before the change
+		:param mapping: dict {old id: new id, or None to remove the samples}
+		:return: path of the updated model, None if no samples are left
+		"""
+		labels = recognizer.getLabels().ravel()
+		new_labels = labels.copy()
+		keep = np.ones(len(labels), dtype=bool)
+		for old_id, new_id in mapping.items():
+			if new_id is None:
+				keep &= labels != old_id
+			else:
+				new_labels[labels == old_id] = new_id
+
+		yml_path = None
+		if keep.any():
+			histograms = recognizer.getHistograms()
+			yml_path = self._new_model_path(path)
+			self._write_model(yml_path, recognizer, [histograms[i] for i in np.flatnonzero(keep)], new_labels[keep])
+		if self.model_cache is not None:
+			self.model_cache.prune(path, yml_path)
+		return yml_path
+
+
+def normalize_faces_dir(path: str, size: tuple[int, int]) -> int:
+	"""
+	Resize all face pictures in the directory to the canonical size in place
+	:param path: directory with faces pictures
+	:param size: (width, height) of the face picture
+	:return: number of resized pictures
+	"""
+	resized = 0
+	for filename in os.listdir(path):
+		img_path = os.path.join(path, filename)
+		img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+		if img is None or (img.shape[1], img.shape[0]) == tuple(size):
+			continue
+		cv2.imwrite(img_path, cv2.resize(img, tuple(size), interpolation=cv2.INTER_AREA))
+		resized += 1
+	return resized
@@ -0,0 +1,56 @@
+from __future__ import annotations
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class FrameReader:
+	"""
+	Camera frame source which reuses preallocated frame and grayscale buffers,
+	so the capture loop does not allocate new images on every frame.
+	"""
+	def __init__(self, cam):
+		self._cam = cam
+		self.frame: Optional[np.ndarray] = None
+		self.gray: Optional[np.ndarray] = None
+
+	def __str__(self):
+		return "Frame reader"
+
+	def read(self) -> bool:
+		"""
+		Read the next frame into self.frame and its grayscale version into self.gray
+		:return: False if the camera did not return a frame
+		"""
+		ret, frame = self._cam.read(self.frame)
+		if not ret:
+			return False
+		if frame is not self.frame:  # first frame or the camera resolution changed
+			self.frame = frame
+			self.gray = np.empty(frame.shape[:2], dtype=np.uint8)
+		cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+		return True
+
+	def release(self):
+		self._cam.release()
+
+
+class FaceResizer:
+	"""
+	Resizes face regions to the canonical size into a reusable buffer.
+	"""
+	def __init__(self, size: tuple[int, int]):
+		self._SIZE = tuple(size)
+		self._buffer = np.empty((self._SIZE[1], self._SIZE[0]), dtype=np.uint8)
+
+	@property
+	def size(self) -> tuple[int, int]:
+		return self._SIZE
+
+	def resize(self, face: np.ndarray) -> np.ndarray:
+		"""
+		:param face: grayscale face region, may be a view of the frame
+		:return: the buffer with the resized face, valid until the next call
+		"""
+		return cv2.resize(face, self._SIZE, dst=self._buffer, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Optional
+
+import hashlib
+import os
+
+
+class ModelNotFoundError(Exception):
+	"""
+	Exception thrown when there is no trained model for the faces directory.
+	"""
+	pass
+
+
+class ModelCache:
+	"""
+	Storage of trained models, one model per faces directory.
+
+	A model is keyed by the fingerprint of the directory content (file names, sizes and modification times),
+	so switching between directories loads the matching model and a retrain is needed only if the content changes.
+	"""
+	def __init__(self, cache_dir: str = 'models'):
+		self._CACHE_DIR = cache_dir
+
+	def __str__(self):
+		return "Model cache"
+
+	@staticmethod
+	def fingerprint(faces_dir: str) -> str:
+		"""
+		:param faces_dir: directory with faces pictures
+		:return: hash of the directory content
+		"""
+		digest = hashlib.sha1()
+		for entry in sorted(os.scandir(faces_dir), key=lambda e: e.name):
+			stat = entry.stat()
+			digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+		return digest.hexdigest()
+
+	def _models_dir(self, faces_dir: str) -> str:
+		dir_key = hashlib.sha1(os.path.abspath(faces_dir).encode()).hexdigest()[:16]
+		return os.path.join(self._CACHE_DIR, dir_key)
+
+	def model_path(self, faces_dir: str) -> str:
+		"""
+		:param faces_dir: directory with faces pictures
+		:return: path of the model matching the current content of the directory, it may not exist yet
+		"""
+		return os.path.join(self._models_dir(faces_dir), f"{self.fingerprint(faces_dir)}.yml")
+
+	def lookup(self, faces_dir: str) -> Optional[str]:
+		"""
+		:param faces_dir: directory with faces pictures
+		:return: path of the cached model or None if the directory has changed since the last training
+		"""
+		path = self.model_path(faces_dir)
+		return path if os.path.isfile(path) else None
+
+	def new_model_path(self, faces_dir: str) -> str:
+		"""
+		:param faces_dir: directory with faces pictures
+		:return: path to write a model trained on the current content of the directory to
+		"""
+		os.makedirs(self._models_dir(faces_dir), exist_ok=True)
+		return self.model_path(faces_dir)
+
+	def prune(self, faces_dir: str, keep_path: Optional[str]):
+		"""
+		Remove outdated models of the directory
+		:param faces_dir: directory with faces pictures
+		:param keep_path: the current model, None to remove all models of the directory
+		"""
+		models_dir = self._models_dir(faces_dir)
+		if not os.path.isdir(models_dir):
+			return
+		for filename in os.listdir(models_dir):
+			path = os.path.join(models_dir, filename)
+			if filename.endswith('.yml') and (keep_path is None or not os.path.samefile(path, keep_path)):
+				os.remove(path)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+from typing import Optional
+
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class ProfilingSession:
+	"""
+	Opt-in profiling of the application workload.
+
+	While the session is running, a background thread periodically samples the stacks of the threads
+	inside recorded sections, and cProfile traces the first of them.
+	Work handed over to other threads, e.g. a thread pool, is sampled only if it is wrapped with bind.
+	On stop, the samples are written as flamegraph-compatible collapsed stacks (one "frame;frame;... count" per line)
+	and the cProfile statistics as a .pstats file.
+	"""
+	def __init__(self, output_dir: str = 'profiles', interval: float = 0.005):
+		if interval <= 0:
+			raise ValueError("Sampling interval should be positive")
+		self._OUTPUT_DIR = output_dir
+		self._INTERVAL = interval
+		self._lock = threading.Lock()
+		self._threads: dict[int, list] = {}  # thread id: [section name, nesting depth]
+		self._stacks = Counter()
+		self._profile = cProfile.Profile()
+		self._profiled_thread: Optional[int] = None
+		self._stop_event = threading.Event()
+		self._sampler = threading.Thread(target=self._sample, name="profiler sampler", daemon=True)
+		self._started = time.strftime("%Y%m%d-%H%M%S")
+		self._sampler.start()
+
+	def __str__(self):
+		return "Profiling session"
+
+	@staticmethod
+	def _collapse(frame) -> list[str]:
+		stack = []
+		while frame is not None:
+			code = frame.f_code
+			stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+			frame = frame.f_back
+		stack.reverse()
+		return stack
+
+	def _sample(self):
+		while not self._stop_event.wait(self._INTERVAL):
+			frames = sys._current_frames()
+			with self._lock:
+				threads = {tid: section[0] for tid, section in self._threads.items()}
+			for tid, name in threads.items():
+				frame = frames.get(tid)
+				if frame is not None:
+					self._stacks[";".join([name] + self._collapse(frame))] += 1
+			del frames
+
+	@contextmanager
+	def record(self, name: str):
+		"""
+		Profile the code inside the section. Nested sections are attributed to the outermost one.
+		:param name: section name, the root frame of its stacks
+		"""
+		tid = threading.get_ident()
+		with self._lock:
+			if tid in self._threads:
+				self._threads[tid][1] += 1
+			else:
+				self._threads[tid] = [name, 1]
+				if self._profiled_thread is None:
+					self._profiled_thread = tid
+					self._profile.enable()
+		try:
+			yield
+		finally:
+			with self._lock:
+				self._threads[tid][1] -= 1
+				if self._threads[tid][1] == 0:
+					del self._threads[tid]
+					if self._profiled_thread == tid:
+						self._profile.disable()
+						self._profiled_thread = None
+
+	def bind(self, func):
+		"""
+		Wrap the function to be recorded under the section of the current thread when called from another thread
+		:param func: function submitted to a thread pool
+		:return: the wrapped function, or func itself if the current thread is not inside a section
+		"""
+		with self._lock:
+			section = self._threads.get(threading.get_ident())
+		if section is None:
+			return func
+		name = section[0]
+
+		def recorded(*args, **kwargs):
+			with self.record(name):
+				return func(*args, **kwargs)
+		return recorded
+
+	def stop(self) -> tuple[str, str]:
+		"""
+		Stop sampling and write the results
+		:return: paths of the collapsed stacks file and the cProfile statistics file
+		"""
+		self._stop_event.set()
+		self._sampler.join()
+
+		os.makedirs(self._OUTPUT_DIR, exist_ok=True)
+		collapsed_path = os.path.join(self._OUTPUT_DIR, f"profile-{self._started}.collapsed")
+		pstats_path = os.path.join(self._OUTPUT_DIR, f"profile-{self._started}.pstats")
+
+		with open(collapsed_path, 'w') as f:
+			for stack, count in self._stacks.most_common():
+				f.write(f"{stack} {count}\n")
+		self._profile.create_stats()
+		self._profile.dump_stats(pstats_path)
+		return collapsed_path, pstats_path
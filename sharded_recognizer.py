@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import threading
+import weakref
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+_BLOCK_ELEMENTS = 2 ** 21  # 16 MiB per float64 temporary buffer
+
+
+def _chi_square_alt(gallery: np.ndarray, query: np.ndarray) -> np.ndarray:
+	"""
+	Vectorized cv2.HISTCMP_CHISQR_ALT distance between the query and every gallery histogram,
+	the same metric LBPHFaceRecognizer.predict uses. Like cv2.compareHist, it is computed in double precision
+	and skips the bins where both histograms are zero up to DBL_EPSILON.
+	The gallery is processed in blocks of at most _BLOCK_ELEMENTS values through reused buffers,
+	so the temporary memory does not depend on the histogram length or the gallery size.
+	"""
+	block = max(1, _BLOCK_ELEMENTS // gallery.shape[1])
+	den = np.empty((min(block, len(gallery)), gallery.shape[1]), dtype=np.float64)
+	num = np.empty_like(den)
+	nonzero = np.empty(den.shape, dtype=bool)
+	eps = np.finfo(np.float64).eps
+
+	distances = np.empty(len(gallery), dtype=np.float64)
+	for start in range(0, len(gallery), block):
+		rows = gallery[start:start + block]
+		n = len(rows)
+		np.add(rows, query, out=den[:n], dtype=np.float64)
+		np.subtract(rows, query, out=num[:n], dtype=np.float64)
+		np.square(num[:n], out=num[:n])
+		np.greater(den[:n], eps, out=nonzero[:n])  # LBPH histograms are non-negative
+		np.divide(num[:n], den[:n], out=num[:n], where=nonzero[:n])
+		np.logical_not(nonzero[:n], out=nonzero[:n])
+		np.putmask(num[:n], nonzero[:n], 0)
+		distances[start:start + n] = 2 * num[:n].sum(axis=1, dtype=np.float64)
+	return distances
+
+
+def _serve_shard(shm_name: str, shape: tuple, dtype: str, start: int, end: int, labels: np.ndarray, conn):
+	"""
+	Worker process loop: match incoming query histograms against its slice of the shared gallery.
+	"""
+	shm = shared_memory.SharedMemory(name=shm_name)
+	gallery = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[start:end]
+	try:
+		while True:
+			query = conn.recv()
+			if query is None:
+				break
+			if len(gallery) == 0:
+				conn.send((-1, float('inf')))
+				continue
+			distances = _chi_square_alt(gallery, query)
+			best = int(np.argmin(distances))
+			conn.send((int(labels[best]), float(distances[best])))
+	finally:
+		del gallery
+		shm.close()
+		conn.close()
+
+
+class ShardedRecognizer:
+	"""
+	LBPH recognizer which partitions the gallery by identity into shards,
+	each one served by its own worker process.
+	Histograms are kept in shared memory, so the workers do not copy the gallery.
+	The workers and the shared memory are released by close() or, at the latest, when the interpreter exits.
+	"""
+	def __init__(
+			self,
+			histograms: np.ndarray,
+			labels: np.ndarray,
+			shards: int,
+			radius: int = 1,
+			neighbors: int = 8,
+			grid_x: int = 8,
+			grid_y: int = 8
+	):
+		if shards < 1:
+			raise ValueError("Shard count should be positive")
+
+		self._encoder = cv2.face.LBPHFaceRecognizer_create(radius, neighbors, grid_x, grid_y)
+		self._lock = threading.Lock()  # the encoder and the pipes are shared by all predict calls
+
+		order, bounds = self._partition(labels, shards)
+		histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+		labels = np.asarray(labels).ravel()[order]
+
+		self._shm = shared_memory.SharedMemory(create=True, size=max(histograms.nbytes, 1))
+		self._connections = []
+		self._workers = []
+		self._finalizer = weakref.finalize(self, self._shutdown, self._connections, self._workers, self._shm)
+
+		try:
+			gallery = np.ndarray(histograms.shape, dtype=np.float32, buffer=self._shm.buf)
+			np.take(histograms, order, axis=0, out=gallery)
+			del gallery
+
+			for start, end in bounds:
+				parent_conn, child_conn = mp.Pipe()
+				worker = mp.Process(
+					target=_serve_shard,
+					args=(self._shm.name, histograms.shape, 'float32', start, end, labels[start:end], child_conn),
+					daemon=True
+				)
+				worker.start()
+				child_conn.close()
+				self._connections.append(parent_conn)
+				self._workers.append(worker)
+		except BaseException:
+			self._finalizer()
+			raise
+
+	def __str__(self):
+		return f"Sharded LBPH recognizer ({len(self._workers)} shards)"
+
+	@classmethod
+	def from_model(cls, yml_path: str, shards: int) -> ShardedRecognizer:
+		"""
+		Create a sharded recognizer from a trained LBPH model
+		:param yml_path: .yml file written by Trainer
+		:param shards: number of worker processes
+		"""
+		recognizer = cv2.face.LBPHFaceRecognizer_create()
+		recognizer.read(yml_path)
+		histograms = np.vstack([h.ravel() for h in recognizer.getHistograms()])
+		return cls(
+			histograms,
+			recognizer.getLabels(),
+			shards,
+			recognizer.getRadius(),
+			recognizer.getNeighbors(),
+			recognizer.getGridX(),
+			recognizer.getGridY()
+		)
+
+	@staticmethod
+	def _partition(labels: np.ndarray, shards: int) -> tuple[np.ndarray, list[tuple[int, int]]]:
+		"""
+		Assign identities to shards balancing the sample count, all samples of one identity go to the same shard.
+		:return: sample order which makes every shard contiguous and (start, end) bounds of the shards
+		"""
+		ids, counts = np.unique(np.asarray(labels).ravel(), return_counts=True)
+		shard_ids = [[] for _ in range(shards)]
+		shard_sizes = [0] * shards
+		for i in np.argsort(-counts, kind='stable'):
+			lightest = shard_sizes.index(min(shard_sizes))
+			shard_ids[lightest].append(ids[i])
+			shard_sizes[lightest] += counts[i]
+
+		shard_of = {id_: shard for shard, members in enumerate(shard_ids) for id_ in members}
+		order = np.argsort([shard_of[id_] for id_ in np.asarray(labels).ravel()], kind='stable')
+
+		bounds = []
+		start = 0
+		for size in shard_sizes:
+			bounds.append((start, start + int(size)))
+			start += int(size)
+		return order, bounds
+
+	def _histogram(self, img: np.ndarray) -> np.ndarray:
+		self._encoder.train([img], np.array([0]))
+		return self._encoder.getHistograms()[0].ravel()
+
+	def predict(self, img: np.ndarray) -> tuple[int, float]:
+		"""
+		Same as LBPHFaceRecognizer.predict: find the closest face among all shards
+		:param img: grayscale face image
+		:return: id of the user and the distance to the closest sample
+		"""
+		with self._lock:
+			query = self._histogram(img)
+			for conn in self._connections:
+				conn.send(query)
+			return min((conn.recv() for conn in self._connections), key=lambda result: result[1])
+
+	@staticmethod
+	def _shutdown(connections: list, workers: list, shm: shared_memory.SharedMemory):
+		for conn in connections:
+			try:
+				conn.send(None)
+			except OSError:  # the worker is already gone
+				pass
+			conn.close()
+		for worker in workers:
+			worker.join(timeout=5)
+			if worker.is_alive():
+				worker.terminate()
+		connections.clear()
+		workers.clear()
+		shm.close()
+		shm.unlink()
+
+	def close(self):
+		"""
+		Stop the worker processes and release the shared memory. Calling it again does nothing.
+		"""
+		self._finalizer()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
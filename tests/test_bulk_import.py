@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+
+from face_loader import BulkLoader  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def bulk_loader(tmp_path, monkeypatch):
+	monkeypatch.chdir(ROOT)  # the loaders read the cascade files from the working directory
+	return BulkLoader(workers=1, state_path=str(tmp_path / "bulk_import.json"))
+
+
+def _dirs(tmp_path, *names):
+	paths = [tmp_path / name for name in names]
+	for path in paths:
+		path.mkdir()
+	return [str(path) for path in paths]
+
+
+def test_resume_into_another_faces_dir_is_rejected(bulk_loader, tmp_path):
+	photos, site_a, site_b = _dirs(tmp_path, "photos", "site_a", "site_b")
+	bulk_loader.load(site_a, source=photos)  # interrupted: the state is kept until finish()
+
+	with pytest.raises(RuntimeError):
+		bulk_loader.load(site_b, source=photos)
+	bulk_loader.load(site_a, source=photos)
+
+
+def test_resume_from_another_root_is_rejected(bulk_loader, tmp_path):
+	photos, other_photos, site = _dirs(tmp_path, "photos", "other_photos", "site")
+	bulk_loader.load(site, source=photos)
+
+	with pytest.raises(RuntimeError):
+		bulk_loader.load(site, source=other_photos)
+	bulk_loader.finish()
+	bulk_loader.load(site, source=other_photos)
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("numpy")
+
+from benchmark import measure_frame_allocations  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# a frame loop without buffer reuse allocates over 1 MB per 640x480 frame (frame, gray image and face copies)
+MAX_BYTES_PER_FRAME = 4096
+
+
+def test_frame_loop_steady_state_allocations(monkeypatch):
+	monkeypatch.chdir(ROOT)  # the detectors read the cascade files from the working directory
+
+	peak, retained = measure_frame_allocations(frames=100)
+
+	assert peak < MAX_BYTES_PER_FRAME
+	assert retained < 64
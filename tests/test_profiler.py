@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from profiler import ProfilingSession
+
+
+def _pooled_work(seconds: float):
+	end = time.perf_counter() + seconds
+	while time.perf_counter() < end:
+		pass
+
+
+def test_pool_threads_are_sampled_in_section(tmp_path):
+	session = ProfilingSession(str(tmp_path), interval=0.001)
+	with ThreadPoolExecutor(2) as pool:
+		with session.record("verify"):
+			list(pool.map(session.bind(_pooled_work), [0.2, 0.2]))
+		pool.submit(_pooled_work, 0.05).result()  # outside the section, not sampled
+	collapsed_path, _ = session.stop()
+
+	with open(collapsed_path) as f:
+		stacks = [line.rsplit(" ", 1)[0] for line in f]
+	pooled = [stack for stack in stacks if "_pooled_work" in stack]
+	assert pooled
+	assert all(stack.startswith("verify;") for stack in pooled)
+	assert any("_bootstrap" in stack for stack in pooled)  # sampled in the pool threads, not the caller
+
+
+def test_bind_outside_section(tmp_path):
+	session = ProfilingSession(str(tmp_path), interval=0.01)
+	assert session.bind(_pooled_work) is _pooled_work
+	session.stop()
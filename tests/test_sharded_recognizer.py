@@ -0,0 +1,46 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from face_loader import Trainer  # noqa: E402
+from sharded_recognizer import ShardedRecognizer  # noqa: E402
+
+USERS = 3
+SAMPLES = 4
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+	"""
+	LBPH model trained on USERS synthetic users and query faces: noisy copies of every sample and unrelated pictures
+	:return: path of the model and the query images
+	"""
+	faces_dir = tmp_path_factory.mktemp("faces")
+	rng = np.random.default_rng(0)
+	queries = []
+	for face_id in range(USERS):
+		base = rng.integers(0, 256, (100, 100)).astype(np.int16)
+		for num in range(1, SAMPLES + 1):
+			img = np.clip(base + rng.integers(-8, 9, base.shape), 0, 255).astype(np.uint8)
+			cv2.imwrite(str(faces_dir / f"user{face_id}.{face_id}.{num}.png"), img)
+			queries.append(np.clip(img + rng.integers(-4, 5, img.shape), 0, 255).astype(np.uint8))
+	queries += [rng.integers(0, 256, (100, 100)).astype(np.uint8) for _ in range(3)]
+	queries.append(np.zeros((100, 100), dtype=np.uint8))  # empty histogram bins on both sides
+
+	yml_path = Trainer().train(str(faces_dir), str(faces_dir.parent / "face.yml"))
+	return yml_path, queries
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, USERS + 5])  # more shards than identities leaves some of them empty
+def test_predictions_match_lbph(model, shards):
+	yml_path, queries = model
+	recognizer = cv2.face.LBPHFaceRecognizer_create()
+	recognizer.read(yml_path)
+
+	with ShardedRecognizer.from_model(yml_path, shards) as sharded:
+		for img in queries:
+			label, distance = sharded.predict(img)
+			expected_label, expected_distance = recognizer.predict(img)
+			assert label == expected_label
+			assert distance == pytest.approx(expected_distance, rel=1e-9)
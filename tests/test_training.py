@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from face_loader import Trainer  # noqa: E402
+
+USERS = 4
+SAMPLES = 5
+
+
+@pytest.fixture
+def faces_dir(tmp_path):
+	faces_dir = tmp_path / "faces"
+	faces_dir.mkdir()
+	rng = np.random.default_rng(0)
+	for face_id in range(USERS):
+		for num in range(1, SAMPLES + 1):
+			cv2.imwrite(str(faces_dir / f"user{face_id}.{face_id}.{num}.png"), rng.integers(0, 256, (100, 100)).astype(np.uint8))
+	return str(faces_dir)
+
+
+def _read(yml_path: str):
+	recognizer = cv2.face.LBPHFaceRecognizer_create()
+	recognizer.read(yml_path)
+	return recognizer
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 200 * 1024, 2 ** 30])  # one face per chunk, several faces, whole gallery
+def test_streaming_training_equals_one_shot(faces_dir, tmp_path, chunk_bytes):
+	one_shot = _read(Trainer().train(faces_dir, str(tmp_path / "one_shot.yml")))
+	streaming = _read(Trainer(chunk_bytes).train(faces_dir, str(tmp_path / "streaming.yml")))
+
+	assert np.array_equal(one_shot.getLabels(), streaming.getLabels())
+	assert len(streaming.getHistograms()) == USERS * SAMPLES
+	for a, b in zip(one_shot.getHistograms(), streaming.getHistograms()):
+		assert np.array_equal(a, b)
+	for filename in os.listdir(faces_dir):
+		img = cv2.imread(os.path.join(faces_dir, filename), cv2.IMREAD_GRAYSCALE)
+		assert streaming.predict(img) == one_shot.predict(img)
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from face_loader import FaceLoader  # noqa: E402
+from model_cache import ModelCache  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 3
+SAMPLES = 5
+
+
+@pytest.fixture
+def gallery(tmp_path, monkeypatch):
+	"""
+	Faces directory with a trained model of USERS synthetic users, each one with its own texture.
+	:return: the loader and dict {user id: face images}
+	"""
+	monkeypatch.chdir(ROOT)  # the loaders read the cascade files from the working directory
+	faces_dir = tmp_path / "faces"
+	faces_dir.mkdir()
+
+	rng = np.random.default_rng(0)
+	faces = {}
+	for face_id in range(USERS):
+		base = rng.integers(0, 256, (100, 100)).astype(np.int16)
+		faces[face_id] = []
+		for num in range(1, SAMPLES + 1):
+			img = np.clip(base + rng.integers(-8, 9, base.shape), 0, 255).astype(np.uint8)
+			cv2.imwrite(str(faces_dir / f"user{face_id}.{face_id}.{num}.png"), img)
+			faces[face_id].append(img)
+
+	loader = FaceLoader(saves_path=str(faces_dir), model_cache=ModelCache(str(tmp_path / "models")))
+	loader.ensure_trained()
+	return loader, faces
+
+
+def _ids_on_disk(loader: FaceLoader) -> set:
+	return {int(f.split('.')[1]) for f in os.listdir(loader._SAVES_PATH)}
+
+
+def test_removed_user_is_not_matched(gallery):
+	loader, faces = gallery
+
+	loader.remove_user(1)
+
+	recognizer = loader.trainer.load_model(loader._SAVES_PATH)  # the rewritten model is readable by OpenCV
+	assert set(recognizer.getLabels().ravel()) == {0, 2}
+	assert len(recognizer.getHistograms()) == len(os.listdir(loader._SAVES_PATH))
+	assert _ids_on_disk(loader) == {0, 2}
+	for face_id, images in faces.items():
+		for img in images:
+			label, _ = recognizer.predict(img)
+			assert label != 1
+			if face_id != 1:
+				assert label == face_id
+
+
+def test_merged_user_is_matched_as_target(gallery):
+	loader, faces = gallery
+
+	loader.merge_users(2, 0)
+
+	recognizer = loader.trainer.load_model(loader._SAVES_PATH)
+	assert set(recognizer.getLabels().ravel()) == {0, 1}
+	assert _ids_on_disk(loader) == {0, 1}
+	assert len([f for f in os.listdir(loader._SAVES_PATH) if f.startswith("user0.0.")]) == 2 * SAMPLES
+	for img in faces[2]:
+		assert recognizer.predict(img)[0] == 0
+	for img in faces[1]:
+		assert recognizer.predict(img)[0] == 1
+
+
+def test_remove_unknown_user(gallery):
+	loader, _ = gallery
+
+	with pytest.raises(ValueError):
+		loader.remove_user(USERS)